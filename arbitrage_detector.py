@@ -1,21 +1,116 @@
 import websocket
 import json
-import itertools
+try:
+    from orjson import loads as json_loads
+except ImportError:  # Fall back to ujson, still much faster than the standard json module
+    from ujson import loads as json_loads
 import requests
-from decimal import Decimal
+import os
+import time
+import itertools
+import numpy as np
+from numba import njit, prange
+from queue import SimpleQueue, Empty
 from threading import Thread
+from dataclasses import dataclass
+from pathlib import Path
+
+@dataclass(slots=True)
+class Tri:
+    """Triangle A->B->C with its trading pairs resolved into AB, BC and AC roles."""
+    a: str
+    b: str
+    c: str
+    sym_ab: str
+    sym_bc: str
+    sym_ac: str
+    code: str  # Triangle code, A-B-C
+    quote_tmpl: str  # Display template of the 3 quotes, filled with either the asks or the bids
+
+@njit(parallel=True, fastmath=True, cache=True, nogil=True)
+def scan_triangles(ask, bid, idx_ab, idx_bc, idx_ac, ready, out):
+    """
+    Flag the triangles with triangular arbitrage in a single fused pass. Runs without the GIL and
+    allocates nothing, so the WebSocket threads keep reading frames while a scan is running.
+
+    Args:
+        ask (ndarray): Latest ask price per symbol id.
+        bid (ndarray): Latest bid price per symbol id.
+        idx_ab (ndarray): Symbol id of AB per triangle.
+        idx_bc (ndarray): Symbol id of BC per triangle.
+        idx_ac (ndarray): Symbol id of AC per triangle.
+        ready (ndarray): Ready mask per triangle, 0b111 once all 3 trading pairs have data.
+        out (ndarray): Preallocated uint8 array, set to 1 for triangles with arbitrage, 0 otherwise.
+    """
+    for t in prange(idx_ab.size):
+        out[t] = 0
+        if ready[t] != 0b111:
+            continue
+        condition1 = ask[idx_ab[t]] * ask[idx_bc[t]] / bid[idx_ac[t]]
+        condition2 = bid[idx_ab[t]] * bid[idx_bc[t]] / ask[idx_ac[t]]
+        if condition1 < 1.0 or condition2 > 1.0:  # If arbitrage exists
+            out[t] = 1
+
+NO_ARBITRAGE_ROW = ("", "", "NO")  # Shared result row of triangles without arbitrage, quotes are not shown
 
 class ArbitrageDetector:
     def __init__(self):
         """Initialize the ArbitrageDetector class."""
-        self.book_ticker_data = {}  # Real-time bookTicker data of potential combinations
-        self.result = {}  # Final result of assets with potential triangular arbitrage
+        self.result = {}  # Final result of assets with potential triangular arbitrage, replaced but never mutated
+        self.working_result = {}  # Result rows written by the scans, published to result as a copy
+        self.result_version = 0  # Incremented whenever result changes, lets the Dash app skip unchanged updates
+        self.result_changed = False  # Whether working_result changed since it was last published
         self.correct_triangles = []  # Triangles in correct form with only 3 assets and no circular pairs
         self.trading_pair_limit = 400  # Number of trading pairs to be fetched
-        self.target_assets = ["BTC", "USDT", "ETH", "BNB", "XRP", "ADA", "SOL", "DOT", "DOGE", "LTC", "LINK"]
+        self.exchange_info_cache = Path("~/.cache/tankx/exchange_info.json").expanduser()
+        self.exchange_info_ttl = 3600  # Seconds before the cached exchangeInfo is fetched again
+        self.target_assets = frozenset(["BTC", "USDT", "ETH", "BNB", "XRP", "ADA", "SOL", "DOT", "DOGE", "LTC",
+                                         "LINK"])  # Set for O(1) membership tests while filtering pairs
         self.all_trading_pairs = self.fetch_trading_pairs(self.trading_pair_limit)
-        self.correct_triangles = self.find_correct_triangles(self.all_trading_pairs)
-        self.symbols = self.build_stream(self.correct_triangles)
+        self.adj = self.build_adjacency(self.all_trading_pairs)  # Asset graph of the fetched trading pairs
+        self.correct_triangles = self.find_correct_triangles(self.adj)
+        self.sym_id = self.build_symbol_ids(self.correct_triangles)  # symbol -> index into ask/bid arrays
+        self.ask = np.empty(len(self.sym_id), dtype=np.float64)  # Latest ask price per symbol id
+        self.bid = np.empty(len(self.sym_id), dtype=np.float64)  # Latest bid price per symbol id
+        self.idx_ab, self.idx_bc, self.idx_ac = self.build_triangle_arrays(self.correct_triangles)
+        # (AB, BC, AC) symbol ids per triangle as Python ints, for the per-row lookups outside the scan
+        self.triangle_sids = list(zip(self.idx_ab.tolist(), self.idx_bc.tolist(), self.idx_ac.tolist()))
+        self.sid_to_tris = self.build_triangle_index(self.triangle_sids, len(self.sym_id))
+        self.ready = np.zeros(len(self.correct_triangles), dtype=np.uint8)  # Bit per trading pair with data
+        self.arbitrage = np.zeros(len(self.correct_triangles), dtype=np.uint8)  # Output of scan_triangles
+        self.previous_arbitrage = np.zeros(len(self.correct_triangles), dtype=np.uint8)  # Output of the last scan
+        self.calculate_triangular_arbitrage()  # Warm up, compiles scan_triangles before any tick arrives
+        self.messages = SimpleQueue()  # WebSocket frames waiting to be processed
+        self.connection_count = 3  # Number of WebSocket connections the symbols are sharded across
+        self.symbols = self.build_stream(self.correct_triangles, self.connection_count)
+
+    def fetch_exchange_info(self):
+        """
+        Fetch exchange information from Binance API, cached on disk for exchange_info_ttl seconds.
+
+        Returns:
+            dict: Parsed exchangeInfo response.
+        """
+        cache = self.exchange_info_cache
+        if cache.exists() and time.time() - cache.stat().st_mtime < self.exchange_info_ttl:
+            try:
+                exchange_info = json_loads(cache.read_bytes())
+                if "symbols" in exchange_info:
+                    return exchange_info
+            except ValueError:  # Unreadable cache, fetched again below
+                pass
+
+        response = requests.get("https://api.binance.com/api/v3/exchangeInfo")
+        response.raise_for_status()  # Error responses (rate limits, restricted locations) are never cached
+        exchange_info = json_loads(response.content)
+        if "symbols" not in exchange_info:
+            raise ValueError(f"Unexpected exchangeInfo response: {response.text[:200]}")
+
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        temp_cache = cache.with_name(cache.name + ".tmp")
+        temp_cache.write_bytes(response.content)
+        os.replace(temp_cache, cache)  # Atomic, an interrupted write never leaves a truncated cache behind
+        return exchange_info
 
     def fetch_trading_pairs(self, limit):
         """
@@ -28,120 +123,199 @@ class ArbitrageDetector:
             list: List of trading pairs with their respective assets.
         """
         print("Fetching trading pairs...") # notify user via terminal
-        initial_data = requests.get("https://api.binance.com/api/v3/exchangeInfo").json()
-        capsules = []  # Capsules are in this format: {symbol: AB, left: A, right: B}
-        for element in initial_data["symbols"]:
-            if len(capsules) >= limit:
-                break
-            if element["baseAsset"] in self.target_assets or element["quoteAsset"] in self.target_assets:
-                capsules.append({
-                    "symbol": element["symbol"],
-                    "left": element["baseAsset"],
-                    "right": element["quoteAsset"]
-                })
-        return capsules
-
-    def find_combinations_of_3(self, data):
-        """
-        Find all combinations of three items from the data.
+        initial_data = self.fetch_exchange_info()
+        targets = self.target_assets
+        # Capsules are in this format: {symbol: AB, left: A, right: B}, islice stops the scan at limit
+        return list(itertools.islice(({"symbol": element["symbol"],
+                                       "left": element["baseAsset"],
+                                       "right": element["quoteAsset"]}
+                                      for element in initial_data["symbols"]
+                                      if element["status"] == "TRADING"
+                                      and (element["baseAsset"] in targets or element["quoteAsset"] in targets)),
+                                     limit))
+
+    def build_adjacency(self, all_trading_pairs):
+        """
+        Build an undirected asset graph from the trading pairs.
 
         Args:
-            data (list): List of trading pairs.
+            all_trading_pairs (list): List of trading pairs.
 
         Returns:
-            list: List of combinations of three trading pairs.
+            dict: Mapping of asset -> {neighbor asset: trading pair}. Circular pairs (A->B, B->A)
+            are dropped at insert time, only the first pair of the two is kept.
+        """
+        adj = {}
+        for capsule in all_trading_pairs:
+            left, right = capsule["left"], capsule["right"]
+            if right in adj.get(left, {}):  # Circular pair, edge already exists
+                continue
+            adj.setdefault(left, {})[right] = capsule
+            adj.setdefault(right, {})[left] = capsule
+        return adj
+
+    def find_correct_triangles(self, adj):
         """
-        return list(itertools.combinations(data, 3))
+        Fetch trading pairs that have potential triangular arbitrage opportunities.
 
-    def check_if_triangle(self, data):
+        Args:
+            adj (dict): Asset graph built by build_adjacency.
+
+        Returns:
+            list: List of valid potential triangular arbitrage opportunities.
+        """
+        print("Finding valid triangles...") # notify user via terminal
+        correct_triangles = []
+        for a in sorted(adj):
+            for b in adj[a]:
+                if b <= a:
+                    continue
+                for c in adj[b]:
+                    if c <= b or c not in adj[a]:  # Each triangle is emitted once, as a < b < c
+                        continue
+                    correct_triangles.append(self.resolve_roles((adj[a][b], adj[b][c], adj[a][c])))
+        return correct_triangles
+
+    def resolve_roles(self, trading_pairs):
+        """
+        Resolve which trading pair of a triangle plays the AB, BC and AC roles.
+
+        Args:
+            trading_pairs (tuple): The three trading pairs of a triangle.
+
+        Returns:
+            Tri: Triangle where AB's right asset is BC's left asset, and AC is the remaining pair.
+        """
+        for i, ab in enumerate(trading_pairs):
+            for j, bc in enumerate(trading_pairs):
+                if ab["right"] == bc["left"]:
+                    ac = trading_pairs[3 - i - j]  # Indices are 0, 1, 2, so the third one is the rest
+                    # Binance quotes carry 8 decimals, so they are displayed the same way
+                    quote_tmpl = f"{ab['symbol']}: {{:.8f}}\n{bc['symbol']}: {{:.8f}}\n{ac['symbol']}: {{:.8f}}\n"
+                    return Tri(ab["left"], ab["right"], bc["right"], ab["symbol"], bc["symbol"], ac["symbol"],
+                               f"{ab['left']}-{ab['right']}-{bc['right']}", quote_tmpl)
+
+    def build_triangle_index(self, triangle_sids, symbol_count):
         """
-        Check if given combination of three forms a triangle: A->B->C->A.
+        Build a reverse index from each symbol id to the triangles it belongs to.
 
         Args:
-            data (list): List of trading pairs with their respective assets.
+            triangle_sids (list): (AB, BC, AC) symbol ids of each triangle.
+            symbol_count (int): Number of symbol ids.
 
         Returns:
-            int: Number of unique assets found in the initial data.
+            list: List indexed by symbol id, holding (triangle id, bit) pairs where bit is the slot
+            of the symbol in the triangle's ready mask.
         """
-        assets = {item["left"] for item in data}.union({item["right"] for item in data})
-        return len(assets)
+        sid_to_tris = [[] for _ in range(symbol_count)]
+        for tid, sids in enumerate(triangle_sids):
+            for slot, sid in enumerate(sids):
+                sid_to_tris[sid].append((tid, 1 << slot))
+        return sid_to_tris
 
-    def check_circular_pairs(self, data):
+    def build_symbol_ids(self, correct_triangles):
         """
-        Check if there are circular pairs in the initial data: A->B, B->A
+        Assign each trading pair symbol used by the triangles a dense integer id.
 
         Args:
-            data (list): List of trading pairs with their respective assets.
+            correct_triangles (list): List of valid triangular arbitrage triangles.
 
         Returns:
-            bool: True if no circular pairs are found, False otherwise.
+            dict: Mapping of symbol -> id, ids run from 0 to the number of symbols.
         """
-        for i in range(len(data)):
-            for j in range(i + 1, len(data)):
-                if (data[i]["left"] == data[j]["right"]) and (data[i]["right"] == data[j]["left"]):
-                    return False
-        return True
+        symbols = sorted({symbol for triangle in correct_triangles
+                          for symbol in (triangle.sym_ab, triangle.sym_bc, triangle.sym_ac)})
+        return {symbol: sid for sid, symbol in enumerate(symbols)}
 
-    def find_correct_triangles(self, all_trading_pairs):
+    def build_triangle_arrays(self, correct_triangles):
         """
-        Fetch trading pairs that have potential triangular arbitrage opportunities.
+        Build the struct-of-arrays form of the triangles for the vectorized scan.
 
         Args:
-            all_trading_pairs (list): List of trading pairs.
+            correct_triangles (list): List of valid triangular arbitrage triangles.
 
         Returns:
-            list: List of valid potential triangular arbitrage opportunities.
+            tuple: Three int32 arrays holding the symbol ids of AB, BC and AC for each triangle.
         """
-        print("Finding valid triangles...") # notify user via terminal
-        combinations = self.find_combinations_of_3(all_trading_pairs)
-        correct_triangles = []
-        for combination in combinations:
-            if self.check_if_triangle(combination) == 3 and self.check_circular_pairs(combination):
-                correct_triangles.append(combination)
-        return correct_triangles
+        idx_ab = np.array([self.sym_id[triangle.sym_ab] for triangle in correct_triangles], dtype=np.int32)
+        idx_bc = np.array([self.sym_id[triangle.sym_bc] for triangle in correct_triangles], dtype=np.int32)
+        idx_ac = np.array([self.sym_id[triangle.sym_ac] for triangle in correct_triangles], dtype=np.int32)
+        return idx_ab, idx_bc, idx_ac
 
-    def build_stream(self, correct_triangles):
+    def build_stream(self, correct_triangles, connection_count):
         """
-        Build the WebSocket stream string from combinations to fetch book tickers.
+        Build the WebSocket subscription requests from the triangles to fetch book tickers.
 
         Args:
-            correct_triangles (list): List of valid triangular arbitrage trading pairs.
+            correct_triangles (list): List of valid triangular arbitrage triangles.
+            connection_count (int): Number of WebSocket connections to shard the trading pairs across.
 
         Returns:
-            str: WebSocket stream string.
+            list: One SUBSCRIBE request per connection, each trading pair is in exactly one of them.
         """
         print("Building the book ticker stream...") # notify user via terminal
-        trading_pairs = {item["symbol"].lower() for triangle in correct_triangles for item in triangle}
-        return "/".join([f"{pair}@bookTicker" for pair in trading_pairs])
+        trading_pairs = sorted({symbol.lower() for triangle in correct_triangles
+                                for symbol in (triangle.sym_ab, triangle.sym_bc, triangle.sym_ac)})
+        shards = [trading_pairs[i::connection_count] for i in range(connection_count)]  # Round-robin
+        return [json.dumps({"method": "SUBSCRIBE", "params": [f"{pair}@bookTicker" for pair in shard], "id": 1})
+                for shard in shards if shard]
 
-    def fetch_book_ticker_data(self, symbols):
+    def fetch_book_ticker_data(self, subscription):
         """
         Fetch real-time book ticker data from Binance using WebSocket.
 
         Args:
-            symbols (str): A string of trading pair symbols for the WebSocket stream.
+            subscription (str): SUBSCRIBE request of the trading pair streams for this connection.
         """
         print("Gathering book ticker data...") # notify user via terminal
-        socket = f"wss://stream.binance.com:9443/stream?streams={symbols}"
-        ws = websocket.WebSocketApp(socket, on_message=self.on_message, on_close=self.on_close, on_error=self.on_error)
-        ws.run_forever()
+        # Raw stream endpoint, frames carry the book ticker itself instead of a {"stream", "data"} wrapper
+        socket = "wss://stream.binance.com:9443/ws"
+        ws = websocket.WebSocketApp(socket, on_open=lambda ws: self.on_open(ws, subscription),
+                                    on_message=self.on_message, on_close=self.on_close, on_error=self.on_error)
+        ws.run_forever(skip_utf8_validation=True)  # Skip the extra UTF-8 validation pass per frame
+
+    def on_open(self, ws, subscription):
+        """
+        Handle WebSocket open event by subscribing to the book ticker streams.
+
+        Args:
+            ws (WebSocketApp): WebSocket application instance.
+            subscription (str): SUBSCRIBE request of the trading pair streams for this connection.
+        """
+        ws.send(subscription)
 
     def on_message(self, ws, message):
         """
-        Handle incoming WebSocket messages.
+        Handle incoming WebSocket messages by queueing them for process_messages.
 
         Args:
             ws (WebSocketApp): WebSocket application instance.
             message (str): Message received from the WebSocket.
         """
-        message_json = json.loads(message)
-        data = message_json["data"]
-        self.book_ticker_data[data["s"]] = data  # Get latest book ticker data
+        self.messages.put_nowait(message)  # Keep the socket reader free, all work is done off this thread
 
-        for target in self.correct_triangles:
-            count = sum(1 for trading_pair in target if trading_pair["symbol"] in self.book_ticker_data)
-            if count == 3:
-                self.calculate_triangular_arbitrage(target)
+    def apply_tick(self, message):
+        """
+        Write the ask and bid of a book ticker message into the SoA arrays.
+
+        Args:
+            message (str): Message received from the WebSocket.
+        """
+        data = json_loads(message)  # Only the symbol, ask and bid of the tick are kept
+        sid = self.sym_id.get(data.get("s"))  # The only string lookup of a tick, the rest is indexed by symbol id
+        if sid is None:  # Response to the SUBSCRIBE request or a symbol no triangle uses, not a tick to apply
+            return
+        self.ask[sid] = float(data["a"])
+        self.bid[sid] = float(data["b"])
+
+        tris = self.sid_to_tris[sid]
+        if tris:  # Only the first tick of a symbol changes readiness, so its index entry is consumed here
+            self.sid_to_tris[sid] = ()
+            for tid, bit in tris:
+                self.ready[tid] |= bit
+                if self.ready[tid] == 0b111:  # Newly ready triangles start as NO, the scan flips them to YES
+                    self.working_result[self.correct_triangles[tid].code] = NO_ARBITRAGE_ROW
+                    self.result_changed = True
 
     def on_close(self, ws):
         """Handle WebSocket close event."""
@@ -157,48 +331,65 @@ class ArbitrageDetector:
         """
         print(error)
 
-    def calculate_triangular_arbitrage(self, trading_pairs):
+    def calculate_triangular_arbitrage(self):
+        """Calculate triangular arbitrage for every triangle whose 3 trading pairs have data."""
+        scan_triangles(self.ask, self.bid, self.idx_ab, self.idx_bc, self.idx_ac, self.ready, self.arbitrage)
+        for tid in np.flatnonzero(self.arbitrage).tolist():  # Rows with arbitrage show their latest quotes
+            self.update_result(tid)
+        for tid in np.flatnonzero(self.previous_arbitrage > self.arbitrage).tolist():  # Arbitrage is gone
+            self.working_result[self.correct_triangles[tid].code] = NO_ARBITRAGE_ROW
+            self.result_changed = True
+        self.arbitrage, self.previous_arbitrage = self.previous_arbitrage, self.arbitrage  # Reuse both buffers
+
+        if self.result_changed:  # Publish with a single reference swap, readers never see a dict being written to
+            self.result = dict(self.working_result)
+            self.result_version += 1
+            self.result_changed = False
+
+    def update_result(self, tid):
+        """
+        Write the latest quotes of a triangle with arbitrage into the result.
+
+        Args:
+            tid (int): Index of the triangle in correct_triangles.
+        """
+        tri = self.correct_triangles[tid]
+        ab, bc, ac = self.triangle_sids[tid]
+        ask, bid = self.ask, self.bid
+
+        row = (tri.quote_tmpl.format(ask[ab], ask[bc], ask[ac]), tri.quote_tmpl.format(bid[ab], bid[bc], bid[ac]),
+               "YES")
+        if self.working_result.get(tri.code) != row:
+            self.working_result[tri.code] = row
+            self.result_changed = True
+
+    def process_message(self, message):
         """
-        Calculate triangular arbitrage based on the trading pairs.
+        Apply a queued WebSocket message, reporting errors instead of stopping process_messages.
 
         Args:
-            trading_pairs (list): List of trading pairs involved in a potential triangular arbitrage.
-        """
-        AB, BC, AC = None, None, None
-        for count1, element1 in enumerate(trading_pairs):
-            for count2, element2 in enumerate(trading_pairs):
-                if element1["right"] == element2["left"]:
-                    AB = element1
-                    BC = element2
-                    AC = trading_pairs[len(trading_pairs) - count1 - count2]
-                    break
-            if AC is not None:
-                break
-
-        ask_AB = Decimal(self.book_ticker_data[AB["symbol"]]["a"])  # Ask and bid values of AB
-        bid_AB = Decimal(self.book_ticker_data[AB["symbol"]]["b"])
-
-        ask_BC = Decimal(self.book_ticker_data[BC["symbol"]]["a"])  # Ask and bid values of BC
-        bid_BC = Decimal(self.book_ticker_data[BC["symbol"]]["b"])
-
-        ask_AC = Decimal(self.book_ticker_data[AC["symbol"]]["a"])  # Ask and bid values of AC
-        bid_AC = Decimal(self.book_ticker_data[AC["symbol"]]["b"])
-
-        condition1 = (ask_AB * ask_BC) * (1 / bid_AC)
-        condition2 = (bid_AB * bid_BC) * (1 / ask_AC)
-
-        arbitrage_code = f"{AB['left']}-{AB['right']}-{BC['right']}"  # Triangle code, A-B-C
-
-        if condition1 < 1 or condition2 > 1:  # If arbitrage exists
-            self.result[arbitrage_code] = [f"{AB['symbol']}: {ask_AB}\n{BC['symbol']}: {ask_BC}\n{AC['symbol']}: {ask_AC}\n",
-                                           f"{AB['symbol']}: {bid_AB}\n{BC['symbol']}: {bid_BC}\n{AC['symbol']}: {bid_AC}\n",
-                                           "YES"]
-        else:  # If arbitrage doesn't exist
-            self.result[arbitrage_code] = [f"{AB['symbol']}: {ask_AB}\n{BC['symbol']}: {ask_BC}\n{AC['symbol']}: {ask_AC}\n",
-                                           f"{AB['symbol']}: {bid_AB}\n{BC['symbol']}: {bid_BC}\n{AC['symbol']}: {bid_AC}\n",
-                                           "NO"]
+            message (str): Message received from the WebSocket.
+        """
+        try:
+            self.apply_tick(message)
+        except Exception as error:  # A bad frame is reported and dropped, the following frames still get applied
+            self.on_error(None, error)
+
+    def process_messages(self):
+        """Apply queued WebSocket messages and scan for triangular arbitrage once per batch."""
+        while True:
+            self.process_message(self.messages.get())  # Block until a message arrives
+            try:  # Drain the rest, every message that arrived meanwhile is covered by a single scan
+                while True:
+                    self.process_message(self.messages.get_nowait())
+            except Empty:
+                pass
+            self.calculate_triangular_arbitrage()
 
     def start(self):
-        """Start the WebSocket connection to fetch real-time book ticker data."""
-        real_time_data_thread = Thread(target=self.fetch_book_ticker_data, args=(self.symbols,))
-        real_time_data_thread.start()
\ No newline at end of file
+        """Start the WebSocket connections to fetch real-time book ticker data."""
+        for subscription in self.symbols:  # One connection per shard, all feeding the same message queue
+            real_time_data_thread = Thread(target=self.fetch_book_ticker_data, args=(subscription,), daemon=True)
+            real_time_data_thread.start()
+        processing_thread = Thread(target=self.process_messages, daemon=True)
+        processing_thread.start()
\ No newline at end of file
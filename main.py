@@ -1,6 +1,5 @@
 import threading
-from dash import dcc, html, dash_table, Input, Output, Dash
-import pandas as pd
+from dash import dcc, html, dash_table, Input, Output, State, Dash, no_update
 import webbrowser
 import requests
 import time
@@ -17,7 +16,7 @@ def open_browser():
             time.sleep(0.1)
     webbrowser.open("http://127.0.0.1:8050/")
 
-def initialize_dash_app(result):
+def initialize_dash_app(detector):
     """Initialize the Dash application for displaying real-time arbitrage opportunities."""
     app = Dash(__name__)
     app.layout = html.Div(children=[
@@ -36,23 +35,29 @@ def initialize_dash_app(result):
             id='interval-component',
             interval=1*250,  # Update every 0.25 seconds, minimizing the delay for real-time data
             n_intervals=0
-        )
+        ),
+        dcc.Store(id='table-version', data=-1)  # Result version currently shown by this client
     ])
 
-    @app.callback(Output('live-update-table', 'data'),
-                  [Input('interval-component', 'n_intervals')])
-    def update_table(n):
-        """Update the table with the latest arbitrage data."""
+    @app.callback([Output('live-update-table', 'data'), Output('table-version', 'data')],
+                  [Input('interval-component', 'n_intervals')],
+                  [State('table-version', 'data')])
+    def update_table(n, shown_version):
+        """Update the table with the latest arbitrage data, only sent when the result has changed."""
+        version = detector.result_version
+        if version == shown_version:
+            return no_update, no_update
+        result = detector.result  # Published snapshot, the detector swaps in a new dict instead of mutating it
         display_data = [
             {
                 "assets": element,
-                "ask_price": result[element][0],
-                "bid_price": result[element][1],
-                "triangular_arbitrage": result[element][2]
+                "ask_price": row[0],
+                "bid_price": row[1],
+                "triangular_arbitrage": row[2]
             }
-            for element in result.keys()
+            for element, row in result.items()
         ]
-        return pd.DataFrame(display_data).to_dict('records')
+        return display_data, version  # Already in the records format DataTable expects
 
     return app
 
@@ -61,6 +66,6 @@ if __name__ == '__main__':
     detector.start()
 
     print("Initializing web server...") # notify user via terminal
-    app = initialize_dash_app(detector.result)
+    app = initialize_dash_app(detector)
     threading.Thread(target=open_browser).start()
     app.run_server()
\ No newline at end of file